@@ -1,12 +1,20 @@
 
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./civicpulse.db"
+SQLALCHEMY_DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./civicpulse.db")
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _sqlite_wal(dbapi_conn, _record):
+        # WAL: readers never wait on a writer's commit, so a burst of accepted writes
+        # does not stall GET /items (rollback-journal readers back off for up to 100 ms)
+        dbapi_conn.execute("PRAGMA journal_mode=WAL")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -16,3 +24,56 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def add_missing_columns(bind=engine):
+    """Tiny forward-only migration: create_all() never alters existing tables, so
+    add any model columns/indexes missing from an older database file.
+    Returns the (table, column) pairs that were added."""
+    from sqlalchemy import inspect
+    insp = inspect(bind)
+    added = []
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing:
+                    continue
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(bind.dialect)}'
+                if col.default is not None and col.default.is_scalar:
+                    ddl += f" DEFAULT {col.default.arg!r}"
+                conn.exec_driver_sql(ddl)
+                added.append((table.name, col.name))
+            for idx in table.indexes:
+                idx.create(bind=conn, checkfirst=True)
+    return added
+
+def enable_autoincrement(bind=engine):
+    """SQLite only sets AUTOINCREMENT in CREATE TABLE, so copy any table whose model asks
+    for it (sqlite_autoincrement=True) but whose existing file predates that into a new
+    table with the same rows. Run after add_missing_columns(). Returns the rebuilt table names."""
+    from sqlalchemy import MetaData
+    from sqlalchemy.schema import CreateTable
+    if bind.dialect.name != "sqlite":
+        return []
+    rebuilt = []
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not table.dialect_options["sqlite"].get("autoincrement"):
+                continue
+            sql = conn.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+            ).scalar()
+            if sql is None or "AUTOINCREMENT" in sql.upper():
+                continue
+            new = table.to_metadata(MetaData(), name=f"{table.name}_new")
+            conn.execute(CreateTable(new))
+            cols = ", ".join(c.name for c in table.columns)
+            conn.exec_driver_sql(f"INSERT INTO {new.name} ({cols}) SELECT {cols} FROM {table.name}")
+            conn.exec_driver_sql(f"DROP TABLE {table.name}")
+            conn.exec_driver_sql(f"ALTER TABLE {new.name} RENAME TO {table.name}")
+            for idx in table.indexes:
+                idx.create(bind=conn, checkfirst=True)
+            rebuilt.append(table.name)
+    return rebuilt
@@ -0,0 +1,151 @@
+# Near-duplicate detection across sources (MinHash + LSH).
+#
+# City Council, County Commission and local news often post the same agenda
+# or notice under slightly different titles. At ingest each item gets MinHash
+# signatures over character shingles of its title and, separately, its
+# summary. Only the title signature is split into LSH bands, scoped to the
+# item's city and category, so shared boilerplate summaries cannot pull
+# distinct notices together. Candidates (ranked by shared bands) are scored on
+# title similarity, blended with summary similarity only when both summaries
+# exist and differ. The best candidate at or above SIMILARITY_THRESHOLD whose
+# title numbers agree (so the Oct 21 and Nov 4 agendas, or Ordinance 123 and
+# 124, stay apart) donates its cluster_id.
+#
+# Each cluster keeps exactly one `is_cluster_head` item (highest importance,
+# earliest id on ties), so the collapsed feed is a plain indexed filter.
+import re
+import struct
+import zlib
+from typing import Iterable, List, Optional, Set
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+
+NUM_PERM = 128
+BANDS = 32                 # 32 bands x 4 rows: a 0.6-similar title is a candidate ~99% of the time
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 4
+SIMILARITY_THRESHOLD = 0.5
+TITLE_WEIGHT = 0.6          # when both summaries are usable; otherwise the title decides alone
+MAX_CANDIDATES = 100
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# fixed seeds so signatures stay comparable across restarts
+_COEFFS = [((i * 0x9E3779B1 + 1) % _PRIME, (i * 0x85EBCA77 + 7) % _PRIME) for i in range(1, NUM_PERM + 1)]
+_PACK = struct.Struct(f"<{NUM_PERM}I")
+_BAND = struct.Struct(f"<{ROWS}I")
+
+def shingles(text: str) -> Set[int]:
+    norm = re.sub(r"[^a-z0-9]+", " ", (text or "").lower()).strip()
+    if len(norm) <= SHINGLE_SIZE:
+        return {zlib.crc32(norm.encode())} if norm else set()
+    return {zlib.crc32(norm[i:i + SHINGLE_SIZE].encode()) for i in range(len(norm) - SHINGLE_SIZE + 1)}
+
+def title_numbers(title: str) -> Set[str]:
+    return {n.lstrip("0") or "0" for n in re.findall(r"\d+", title or "")}
+
+def numbers_agree(a: Set[str], b: Set[str]) -> bool:
+    return not a or not b or a <= b or b <= a
+
+def minhash(sh: Set[int]) -> List[int]:
+    if not sh:
+        return [_MAX_HASH] * NUM_PERM
+    return [min(((a * x + b) % _PRIME) & _MAX_HASH for x in sh) for a, b in _COEFFS]
+
+def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+def score(title_a: List[int], title_b: List[int], summary_a: Optional[bytes], summary_b: Optional[bytes]) -> float:
+    """Title similarity, blended with summary similarity only when both summaries exist and differ
+    (identical summaries are boilerplate, e.g. a scraper placeholder, and say nothing)."""
+    t = similarity(title_a, title_b)
+    if not summary_a or not summary_b or summary_a == summary_b:
+        return t
+    s = similarity(list(_PACK.unpack(summary_a)), list(_PACK.unpack(summary_b)))
+    return TITLE_WEIGHT * t + (1 - TITLE_WEIGHT) * s
+
+def band_keys(sig: List[int], city: Optional[str], category: Optional[str]) -> List[str]:
+    scope = f"{(city or '').lower()}|{(category or '').lower()}"
+    return [
+        f"{scope}|{b}|{zlib.crc32(_BAND.pack(*sig[b * ROWS:(b + 1) * ROWS])):08x}"
+        for b in range(BANDS)
+    ]
+
+def assign_cluster(db: Session, item: models.Item) -> int:
+    """Index `item` (must have an id), set item.cluster_id and keep the cluster head
+    up to date. The caller commits. A new cluster has cluster_id == item.id."""
+    title_sig = minhash(shingles(item.title))
+    summary_sh = shingles(item.summary)
+    summary_blob = _PACK.pack(*minhash(summary_sh)) if summary_sh else None
+    keys = band_keys(title_sig, item.city, item.category)
+    candidate_ids = [
+        row[0] for row in db.query(models.ItemBand.item_id)
+        .filter(models.ItemBand.key.in_(keys), models.ItemBand.item_id != item.id)
+        .group_by(models.ItemBand.item_id)
+        .order_by(func.count().desc())
+        .limit(MAX_CANDIDATES).all()
+    ]
+    best, best_sim = None, SIMILARITY_THRESHOLD
+    if candidate_ids:
+        nums = title_numbers(item.title)
+        rows = db.query(models.ItemSignature.signature, models.ItemSignature.summary_signature,
+                        models.Item.id, models.Item.cluster_id, models.Item.title, models.Item.category) \
+            .join(models.Item, models.Item.id == models.ItemSignature.item_id) \
+            .filter(models.ItemSignature.item_id.in_(candidate_ids)).all()
+        for blob, other_summary, other_id, other_cluster, other_title, other_category in rows:
+            if other_category != item.category or not numbers_agree(nums, title_numbers(other_title)):
+                continue
+            sim = score(title_sig, list(_PACK.unpack(blob)), summary_blob, other_summary)
+            if sim >= best_sim:
+                best, best_sim = other_cluster or other_id, sim
+    cluster_id = best if best is not None else item.id
+    item.cluster_id = cluster_id
+    item.is_cluster_head = True
+    if cluster_id != item.id:
+        head = db.query(models.Item).filter(models.Item.cluster_id == cluster_id, models.Item.id != item.id,
+                                            models.Item.is_cluster_head == True).first()
+        if head is not None and (head.importance or 0.0) >= (item.importance or 0.0):
+            item.is_cluster_head = False
+        elif head is not None:
+            head.is_cluster_head = False
+    db.add(models.ItemSignature(item_id=item.id, signature=_PACK.pack(*title_sig), summary_signature=summary_blob))
+    db.add_all([models.ItemBand(key=k, item_id=item.id) for k in keys])
+    return cluster_id
+
+def promote_heads(db: Session, cluster_ids: Iterable[int]):
+    """Give each cluster without a live head a new one (after its head was archived)."""
+    for cid in set(cluster_ids):
+        if db.query(models.Item.id).filter(models.Item.cluster_id == cid, models.Item.is_cluster_head == True).first():
+            continue
+        nxt = db.query(models.Item).filter(models.Item.cluster_id == cid) \
+            .order_by(models.Item.importance.desc(), models.Item.id.asc()).first()
+        if nxt is not None:
+            nxt.is_cluster_head = True
+
+def rebuild(db: Session):
+    """Drop every signature/band and recluster all items (after a change to the scheme)."""
+    db.query(models.ItemBand).delete(synchronize_session=False)
+    db.query(models.ItemSignature).delete(synchronize_session=False)
+    db.query(models.Item).update({models.Item.cluster_id: None, models.Item.is_cluster_head: True},
+                                 synchronize_session=False)
+    db.commit()
+    return index_existing(db)
+
+def index_existing(db: Session, batch_size: int = 500) -> int:
+    """Backfill signatures/clusters for items created before dedupe existed."""
+    done = 0
+    last_id = 0
+    while True:
+        batch = db.query(models.Item).filter(models.Item.id > last_id, models.Item.cluster_id.is_(None)) \
+            .order_by(models.Item.id.asc()).limit(batch_size).all()
+        if not batch:
+            return done
+        for itm in batch:
+            assign_cluster(db, itm)
+            db.flush()
+        db.commit()
+        done += len(batch)
+        last_id = batch[-1].id
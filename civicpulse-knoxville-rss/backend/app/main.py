@@ -1,20 +1,50 @@
 
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
+from sqlalchemy.orm import Session, aliased
 from typing import List
 from datetime import datetime
+import asyncio
+import os
 import yaml
 
-from .db import Base, engine, get_db
+from .db import Base, engine, get_db, add_missing_columns, enable_autoincrement, SessionLocal
 from . import models, schemas
 from .ranking import score_item
 from .scrapers.generic import scrape_from_config
+from .stream import hub, sse_events, HubFull, REPLAY_LIMIT
+from . import webhooks
+from . import dedupe
+from . import retention
+from .ratelimit import RateLimitMiddleware, client_ip
 
 Base.metadata.create_all(bind=engine)
+_added = add_missing_columns(engine)
+if ("items", "comment_count") in _added:
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "UPDATE items SET comment_count = (SELECT COUNT(*) FROM comments WHERE comments.item_id = items.id)"
+        )
+if "items" in enable_autoincrement(engine):
+    # ids freed by retention before the upgrade must not be handed out again either
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'items'")
+        conn.exec_driver_sql(
+            "INSERT INTO sqlite_sequence (name, seq) SELECT 'items', MAX("
+            "(SELECT COALESCE(MAX(id), 0) FROM items), (SELECT COALESCE(MAX(id), 0) FROM archived_items))"
+        )
+if {("items", "cluster_id"), ("items", "is_cluster_head"), ("item_signatures", "summary_signature")} & set(_added):
+    # new or changed clustering scheme: recluster everything once
+    with SessionLocal() as _db:
+        dedupe.rebuild(_db)
 
 app = FastAPI(title="CivicPulse API", version="0.1.0")
 
+# Flood control on public write endpoints (registered first so CORS headers wrap its 429s)
+app.add_middleware(RateLimitMiddleware)
+
 # CORS for local dev and simple frontend
 app.add_middleware(
     CORSMiddleware,
@@ -24,6 +54,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def start_webhook_dispatcher():
+    # Set WEBHOOK_DISPATCHER=0 on all but one process when running several workers
+    if os.environ.get("WEBHOOK_DISPATCHER", "1") != "0":
+        app.state.webhook_task = asyncio.create_task(webhooks.run_dispatcher())
+
+@app.on_event("startup")
+async def start_retention_worker():
+    # Archives aged items every RETENTION_INTERVAL_SECONDS; RETENTION_WORKER=0 disables (e.g. extra workers)
+    if os.environ.get("RETENTION_WORKER", "1") != "0":
+        app.state.retention_task = asyncio.create_task(retention.run_periodically())
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for name in ("webhook_task", "retention_task"):
+        task = getattr(app.state, name, None)
+        if task:
+            task.cancel()
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
@@ -50,20 +99,101 @@ def create_item(payload: schemas.ItemCreate, db: Session = Depends(get_db)):
         "is_official": itm.is_official
     })
     db.add(itm)
+    db.flush()
+    # Push and alert when the item becomes what the collapsed feed shows: a new story, or a
+    # near-duplicate that outranks the current head (e.g. the official version of a post).
+    # Subscriptions and streams that already got an earlier member of the cluster are skipped.
+    dedupe.assign_cluster(db, itm)
+    if itm.is_cluster_head:
+        webhooks.enqueue_for_item(db, itm)  # outbox rows commit atomically with the item
     db.commit()
     db.refresh(itm)
+    if itm.is_cluster_head:
+        hub.publish(schemas.Item.model_validate(itm, from_attributes=True))
     return itm
 
 @app.get("/items", response_model=List[schemas.Item])
-def list_items(limit: int = 50, db: Session = Depends(get_db), city: str | None = None, category: str | None = None):
+def list_items(limit: int = 50, db: Session = Depends(get_db), city: str | None = None, category: str | None = None,
+               collapse: bool = True, cluster_id: int | None = None):
+    """Ranked feed. With `collapse`, near-duplicates show only their highest-importance member;
+    pass `cluster_id` to list every member of one cluster."""
     q = db.query(models.Item)
     if city:
         q = q.filter(models.Item.city == city)
     if category:
         q = q.filter(models.Item.category == category)
+    if cluster_id is not None:
+        q = q.filter(func.coalesce(models.Item.cluster_id, models.Item.id) == cluster_id)
+    elif collapse:
+        q = q.filter(models.Item.is_cluster_head == True)
     q = q.order_by(models.Item.importance.desc(), models.Item.published_at.desc().nullslast())
     return q.limit(limit).all()
 
+def _stream_backlog(last_event_id: int | None, city: str | None, category: str | None, min_importance: float):
+    """Cursor for a new stream plus the items a reconnecting client missed (id > Last-Event-ID)."""
+    with SessionLocal() as db:
+        cursor = db.query(func.max(models.Item.id)).scalar() or 0
+        if last_event_id is None or last_event_id >= cursor:
+            return cursor, [], False
+        q = db.query(models.Item).filter(models.Item.id > last_event_id, models.Item.id <= cursor,
+                                         models.Item.is_cluster_head == True,
+                                         models.Item.importance >= min_importance)
+        if city: q = q.filter(models.Item.city == city)
+        if category: q = q.filter(models.Item.category == category)
+        missed = q.order_by(models.Item.id.asc()).limit(REPLAY_LIMIT + 1).all()
+        if len(missed) > REPLAY_LIMIT:
+            return cursor, [], True
+        return cursor, [(i.id, schemas.Item.model_validate(i, from_attributes=True).model_dump_json()) for i in missed], False
+
+@app.get("/items/stream")
+async def stream_items(request: Request, city: str | None = None, category: str | None = None, min_importance: float = 0.0):
+    """Server-Sent Events feed of newly created items matching the filters. A reconnecting
+    EventSource sends Last-Event-ID and first gets the matching items it missed."""
+    try:
+        last_event_id = int(request.headers.get("last-event-id", ""))
+    except ValueError:
+        last_event_id = None
+    try:
+        sub = hub.subscribe(city=city, category=category, min_importance=min_importance, client=client_ip(request.scope))
+    except HubFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    try:
+        # subscribed first, so nothing published while the backlog is read is missed
+        cursor, backlog, resync = await asyncio.to_thread(_stream_backlog, last_event_id, city, category, min_importance)
+    except Exception:
+        hub.unsubscribe(sub)
+        raise
+    return StreamingResponse(
+        sse_events(sub, cursor=cursor, backlog=backlog, resync=resync),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/items/search", response_model=List[schemas.Item])
+def search_items(q: str, city: str | None = None, include_archived: bool = True, limit: int = 50, db: Session = Depends(get_db)):
+    """Title/summary search over live items, then title search over the archive."""
+    pattern = f"%{q}%"
+    qry = db.query(models.Item).filter(models.Item.title.ilike(pattern) | models.Item.summary.ilike(pattern))
+    if city: qry = qry.filter(models.Item.city == city)
+    out = [schemas.Item.model_validate(i, from_attributes=True)
+           for i in qry.order_by(models.Item.importance.desc()).limit(limit).all()]
+    if include_archived and len(out) < limit:
+        arch = db.query(models.ArchivedItem).filter(models.ArchivedItem.title.ilike(pattern))
+        if city: arch = arch.filter(models.ArchivedItem.city == city)
+        for a in arch.order_by(models.ArchivedItem.importance.desc()).limit(limit - len(out)).all():
+            out.append(schemas.Item(**retention.unpack(a)["item"], is_archived=True))
+    return out
+
+@app.get("/items/{item_id}", response_model=schemas.Item)
+def get_item(item_id: int, db: Session = Depends(get_db)):
+    itm = db.query(models.Item).filter(models.Item.id == item_id).first()
+    if itm:
+        return itm
+    doc = retention.get_archived(db, item_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return schemas.Item(**doc["item"], is_archived=True)
+
 @app.post("/ingest/from-config")
 def ingest_from_config(db: Session = Depends(get_db)):
     """Mock ingest that reads scraper_sources.yaml and creates placeholder items."""
@@ -79,19 +209,89 @@ def ingest_from_config(db: Session = Depends(get_db)):
 
 @app.post("/comments", response_model=schemas.Comment)
 def add_comment(payload: schemas.CommentCreate, db: Session = Depends(get_db)):
-    # Minimal validation
-    item = db.query(models.Item).filter(models.Item.id == payload.item_id).first()
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
+    # Minimal validation; the count bump doubles as the existence check
     c = models.Comment(item_id=payload.item_id, author=payload.author, body=payload.body)
+    updated = db.query(models.Item).filter(models.Item.id == payload.item_id).update(
+        {models.Item.comment_count: func.coalesce(models.Item.comment_count, 0) + 1}, synchronize_session=False
+    )
+    if not updated:
+        raise HTTPException(status_code=404, detail="Item not found")
     db.add(c)
     db.commit()
     db.refresh(c)
     return c
 
+@app.get("/comments/summary", response_model=List[schemas.CommentSummary])
+def comment_summary(item_ids: List[int] = Query(...), latest: int = Query(3, ge=0, le=20), db: Session = Depends(get_db)):
+    """Counts plus the latest `latest` comments for many items at once (one feed page, one request)."""
+    if len(item_ids) > 100:
+        raise HTTPException(status_code=400, detail="At most 100 item_ids per request")
+    counts = dict(db.query(models.Item.id, models.Item.comment_count).filter(models.Item.id.in_(item_ids)).all())
+    by_item = {i: [] for i in counts}
+    if latest and counts:
+        rn = func.row_number().over(partition_by=models.Comment.item_id, order_by=models.Comment.id.desc()).label("rn")
+        sub = db.query(models.Comment, rn).filter(models.Comment.item_id.in_(list(counts))).subquery()
+        recent = aliased(models.Comment, sub)
+        for c in db.query(recent).filter(sub.c.rn <= latest).order_by(sub.c.item_id, sub.c.id.desc()).all():
+            by_item[c.item_id].append(c)
+    return [{"item_id": i, "count": counts[i] or 0, "latest": by_item[i]} for i in item_ids if i in counts]
+
 @app.get("/comments/{item_id}", response_model=List[schemas.Comment])
-def get_comments(item_id: int, db: Session = Depends(get_db)):
-    return db.query(models.Comment).filter(models.Comment.item_id == item_id).order_by(models.Comment.created_at.desc()).all()
+def get_comments(item_id: int, limit: int = Query(50, ge=1, le=200), before_id: int | None = None, db: Session = Depends(get_db)):
+    """Newest first. Pass the last id you received as `before_id` to get the next page."""
+    q = db.query(models.Comment).filter(models.Comment.item_id == item_id)
+    if before_id is not None:
+        q = q.filter(models.Comment.id < before_id)
+    page = q.order_by(models.Comment.id.desc()).limit(limit).all()
+    if not page and not db.query(models.Item.id).filter(models.Item.id == item_id).first():
+        # item may have been archived together with its comments
+        doc = retention.get_archived(db, item_id)
+        if doc:
+            older = [c for c in reversed(doc["comments"]) if before_id is None or c["id"] < before_id]
+            return older[:limit]
+    return page
+
+
+# ==================== Webhook Alerts ====================
+@app.post("/webhooks", response_model=schemas.WebhookSubscription)
+def create_webhook(payload: schemas.WebhookSubscriptionCreate, db: Session = Depends(get_db)):
+    if payload.kind not in ("slack", "discord", "generic"):
+        raise HTTPException(status_code=400, detail="kind must be slack, discord or generic")
+    data = payload.dict()
+    data["url"] = str(payload.url)
+    error = webhooks.destination_error(data["url"])
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    w = models.WebhookSubscription(**data)
+    db.add(w); db.commit(); db.refresh(w); return w
+
+@app.get("/webhooks", response_model=List[schemas.WebhookSubscription])
+def list_webhooks(db: Session = Depends(get_db), active: bool | None = True):
+    q = db.query(models.WebhookSubscription)
+    if active is not None: q = q.filter(models.WebhookSubscription.is_active == active)
+    return q.order_by(models.WebhookSubscription.id.asc()).all()
+
+@app.post("/webhooks/{webhook_id}/deactivate")
+def deactivate_webhook(webhook_id: int, db: Session = Depends(get_db)):
+    w = db.query(models.WebhookSubscription).filter(models.WebhookSubscription.id == webhook_id).first()
+    if not w:
+        raise HTTPException(status_code=404, detail="Webhook not found")
+    w.is_active = False
+    db.commit()
+    return {"ok": True}
+
+@app.post("/webhooks/dispatch")
+async def dispatch_webhooks():
+    """Deliver due digests now instead of waiting for the next window (admin/testing)."""
+    async with webhooks.make_client() as client:
+        return await webhooks.dispatch_once(client)
+
+
+# ==================== Retention ====================
+@app.post("/retention/run")
+def run_retention(max_batches: int | None = None):
+    """Archive everything currently eligible now (small batches; safe to call while serving)."""
+    return retention.run_once(max_batches=max_batches)
 
 
 # ==================== Marketplace ====================
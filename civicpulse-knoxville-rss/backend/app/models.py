@@ -1,5 +1,5 @@
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Boolean, LargeBinary, Index
 from sqlalchemy.sql import func
 from .db import Base
 
@@ -16,6 +16,34 @@ class Item(Base):
     fetched_at = Column(DateTime(timezone=True), server_default=func.now())
     importance = Column(Float, default=0.0)  # computed score
     is_official = Column(Boolean, default=False)
+    comment_count = Column(Integer, default=0)  # maintained by POST /comments
+    cluster_id = Column(Integer, index=True, nullable=True)  # near-duplicate cluster (see dedupe.py); None = own cluster
+    is_cluster_head = Column(Boolean, default=True)  # highest-importance member of its cluster; the collapsed feed
+    # AUTOINCREMENT: ids of archived items are never handed out again (see retention.py)
+    __table_args__ = (Index("ix_items_head_importance", "is_cluster_head", "importance"), {"sqlite_autoincrement": True})
+
+class ItemSignature(Base):
+    __tablename__ = "item_signatures"
+    item_id = Column(Integer, primary_key=True)
+    signature = Column(LargeBinary, nullable=False)  # packed MinHash of the title
+    summary_signature = Column(LargeBinary, nullable=True)  # packed MinHash of the summary; None = no summary
+
+class ItemBand(Base):
+    __tablename__ = "item_bands"
+    id = Column(Integer, primary_key=True)
+    key = Column(String, index=True, nullable=False)  # LSH bucket: city + category + band number + band hash
+    item_id = Column(Integer, index=True, nullable=False)
+
+class ArchivedItem(Base):
+    __tablename__ = "archived_items"
+    id = Column(Integer, primary_key=True, index=True)  # same id the item had in `items`
+    title = Column(String, index=True, nullable=False)  # kept plain for search
+    city = Column(String, index=True, nullable=True)
+    category = Column(String, index=True, nullable=True)
+    importance = Column(Float, default=0.0)
+    published_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+    payload = Column(LargeBinary, nullable=False)  # zlib-compressed JSON: full item + its comments
 
 class Comment(Base):
     __tablename__ = "comments"
@@ -130,3 +158,27 @@ class Position(Base):
     stance = Column(Text, nullable=True)
     source_url = Column(String, nullable=True)
     date = Column(DateTime, nullable=True)
+
+
+class WebhookSubscription(Base):
+    __tablename__ = "webhook_subscriptions"
+    id = Column(Integer, primary_key=True, index=True)
+    url = Column(String, nullable=False)
+    kind = Column(String, default="generic")  # 'slack','discord','generic' (payload shape)
+    city = Column(String, index=True, nullable=True)  # None = any city
+    category = Column(String, index=True, nullable=True)  # None = any category
+    min_importance = Column(Float, default=0.0)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class WebhookOutbox(Base):
+    __tablename__ = "webhook_outbox"
+    id = Column(Integer, primary_key=True, index=True)
+    subscription_id = Column(Integer, index=True, nullable=False)
+    item_id = Column(Integer, index=True, nullable=False)
+    status = Column(String, index=True, default="pending")  # 'pending','sending','sent','dead'
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, index=True, nullable=True)  # None = due now; lease expiry while 'sending'
+    claim = Column(String, index=True, nullable=True)  # token of the dispatch pass that owns a 'sending' row
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,135 @@
+# Write-side flood control: token buckets per (client IP, endpoint).
+#
+# RateLimitMiddleware sits in front of routing, so a rejected request never
+# opens a DB session or takes the SQLite write lock. The default backend keeps
+# buckets in process memory (LRU-bounded); set RATE_LIMIT_REDIS_URL to share
+# buckets between several workers (needs the optional `redis` package).
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# (method, path) -> (burst, refill per minute)
+WRITE_LIMITS: Dict[Tuple[str, str], Tuple[int, float]] = {
+    ("POST", "/comments"): (5, 6.0),
+    ("POST", "/listings"): (3, 2.0),
+    ("POST", "/community-events"): (3, 2.0),
+    ("POST", "/rsvps"): (5, 6.0),
+    ("POST", "/webhooks"): (3, 2.0),
+}
+MAX_BUCKETS = 50_000
+# Number of reverse proxies in front of the app that append to X-Forwarded-For
+# (1 on Render/Heroku/nginx). The client address is the entry that many hops from
+# the right; anything further left is client-supplied and ignored. 0 = use the socket peer.
+PROXY_HOPS = int(os.environ.get("RATE_LIMIT_PROXY_HOPS", "0"))
+REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL")
+
+log = logging.getLogger(__name__)
+
+class MemoryBackend:
+    """Token buckets in an LRU-evicted dict. An evicted client simply starts
+    again with a full bucket, so memory stays bounded under IP churn."""
+
+    def __init__(self, max_buckets: int = MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, burst: int, rate: float, now: float) -> float:
+        """Consume one token. Returns 0 if allowed, else seconds until one is available.
+        Only called from the event loop, so no lock is needed."""
+        tokens, last = self._buckets.pop(key, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - last) * rate)
+        wait = 0.0
+        if tokens >= 1.0:
+            tokens -= 1.0
+        else:
+            wait = (1.0 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return wait
+
+class RedisBackend:
+    """Shared buckets for multi-worker deployments. `client` is a redis.asyncio.Redis
+    instance, so a limited request never blocks the event loop on the round trip."""
+
+    SCRIPT = """
+local b = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local burst, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens, ts = tonumber(b[1]) or burst, tonumber(b[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+    def __init__(self, client, prefix: str = "rl:"):
+        self.prefix = prefix
+        self._script = client.register_script(self.SCRIPT)
+
+    async def take(self, key: str, burst: int, rate: float, now: float) -> float:
+        try:
+            return float(await self._script(keys=[self.prefix + key], args=[burst, rate, now]))
+        except Exception:
+            # fail open: a Redis outage must not take the write endpoints down with it
+            log.warning("rate limit backend unavailable", exc_info=True)
+            return 0.0
+
+def make_backend(redis_url: Optional[str] = REDIS_URL):
+    if not redis_url:
+        return MemoryBackend()
+    import redis.asyncio  # optional dependency, only needed for shared buckets
+    return RedisBackend(redis.asyncio.from_url(redis_url))
+
+def client_ip(scope, proxy_hops: int = PROXY_HOPS) -> str:
+    """The address PROXY_HOPS entries from the right of X-Forwarded-For, else the socket peer."""
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if proxy_hops <= 0:
+        return peer
+    entries = []
+    for name, value in scope.get("headers", []):
+        if name == b"x-forwarded-for":
+            entries.extend(e.strip() for e in value.decode("latin-1").split(","))
+    entries = [e for e in entries if e]
+    if len(entries) < proxy_hops:
+        return peer  # did not come through the expected proxies
+    return entries[-proxy_hops]
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware (does not buffer responses, so SSE is unaffected)."""
+
+    def __init__(self, app, backend=None, limits: Optional[Dict] = None, proxy_hops: int = PROXY_HOPS):
+        self.app = app
+        self.backend = backend or make_backend()
+        self.limits = WRITE_LIMITS if limits is None else limits
+        self.proxy_hops = proxy_hops
+
+    def client_ip(self, scope) -> str:
+        return client_ip(scope, self.proxy_hops)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            path = scope["path"].rstrip("/") or "/"
+            limit = self.limits.get((scope["method"], path))
+            if limit:
+                burst, per_minute = limit
+                wait = await self.backend.take(f"{self.client_ip(scope)}|{path}", burst, per_minute / 60.0, time.time())
+                if wait > 0:
+                    await self._reject(send, wait)
+                    return
+        await self.app(scope, receive, send)
+
+    async def _reject(self, send, wait: float):
+        body = json.dumps({"detail": "Too many requests"}).encode()
+        await send({"type": "http.response.start", "status": 429, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(wait))).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,125 @@
+# Retention: move aged or low-importance Items (and their Comments) out of the
+# hot tables into `archived_items`, one zlib-compressed JSON row per item.
+#
+# decay_by_age makes old items nearly irrelevant to the ranked feed, so they
+# only cost index size on every GET /items. Compaction runs in small batches,
+# each its own short transaction, with a pause between batches so ingest and
+# comment writes can take the SQLite write lock in between. Archived items stay
+# reachable by id (GET /items/{id}) and title search (GET /items/search).
+import asyncio
+import json
+import logging
+import os
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, or_, and_
+from sqlalchemy.orm import Session
+
+from . import dedupe, models
+from .db import SessionLocal
+
+log = logging.getLogger(__name__)
+
+MAX_AGE_DAYS = float(os.environ.get("RETENTION_MAX_AGE_DAYS", "180"))
+MIN_IMPORTANCE = float(os.environ.get("RETENTION_MIN_IMPORTANCE", "0"))  # 0 = no importance floor
+MIN_IMPORTANCE_GRACE_DAYS = 7.0  # low-importance items still get a week in the feed
+BATCH_SIZE = 200
+BATCH_PAUSE_SECONDS = 0.05
+INTERVAL_SECONDS = float(os.environ.get("RETENTION_INTERVAL_SECONDS", "3600"))
+
+ITEM_FIELDS = ("id", "title", "summary", "url", "source", "category", "city", "published_at", "fetched_at",
+               "importance", "is_official", "comment_count", "cluster_id")
+COMMENT_FIELDS = ("id", "item_id", "author", "body", "created_at")
+
+def _row(obj, fields) -> Dict:
+    out = {}
+    for f in fields:
+        v = getattr(obj, f)
+        out[f] = v.isoformat() if isinstance(v, datetime) else v
+    return out
+
+def pack(item: models.Item, comments: List[models.Comment]) -> bytes:
+    doc = {"item": _row(item, ITEM_FIELDS), "comments": [_row(c, COMMENT_FIELDS) for c in comments]}
+    return zlib.compress(json.dumps(doc, separators=(",", ":")).encode(), 9)
+
+def unpack(archived: models.ArchivedItem) -> Dict:
+    return json.loads(zlib.decompress(archived.payload))
+
+def eligible(db: Session, now: datetime, max_age_days: float = MAX_AGE_DAYS, min_importance: float = MIN_IMPORTANCE):
+    """Query of item ids due for archiving."""
+    age = func.coalesce(models.Item.published_at, models.Item.fetched_at)
+    cond = age < now - timedelta(days=max_age_days)
+    if min_importance > 0:
+        cond = or_(cond, and_(models.Item.importance < min_importance,
+                              age < now - timedelta(days=MIN_IMPORTANCE_GRACE_DAYS)))
+    return db.query(models.Item.id).filter(cond)
+
+def archive_batch(db: Session, item_ids: List[int]) -> int:
+    # Ids reused before items.id was AUTOINCREMENT can already be archived; skip those
+    # rather than failing the whole batch (and every later run) on the primary key.
+    taken = {r[0] for r in db.query(models.ArchivedItem.id).filter(models.ArchivedItem.id.in_(item_ids))}
+    if taken:
+        log.warning("retention: ids %s already archived, leaving them live", sorted(taken))
+        item_ids = [i for i in item_ids if i not in taken]
+    # Write first: the first write takes SQLite's write lock, so from here until commit
+    # no comment can be added to these items between reading and deleting them.
+    db.query(models.ItemBand).filter(models.ItemBand.item_id.in_(item_ids)).delete(synchronize_session=False)
+    items = db.query(models.Item).filter(models.Item.id.in_(item_ids)).all()
+    if not items:
+        db.commit()
+        return 0
+    ids = [i.id for i in items]
+    comments: Dict[int, List[models.Comment]] = {i: [] for i in ids}
+    for c in db.query(models.Comment).filter(models.Comment.item_id.in_(ids)).order_by(models.Comment.id.asc()):
+        comments[c.item_id].append(c)
+    db.add_all([models.ArchivedItem(
+        id=i.id, title=i.title, city=i.city, category=i.category, importance=i.importance,
+        published_at=i.published_at, payload=pack(i, comments[i.id]),
+    ) for i in items])
+    # only what was packed: a comment inserted after the read would have a higher id
+    last_comment = max((c.id for cs in comments.values() for c in cs), default=0)
+    db.query(models.Comment).filter(models.Comment.item_id.in_(ids), models.Comment.id <= last_comment) \
+        .delete(synchronize_session=False)
+    db.query(models.ItemSignature).filter(models.ItemSignature.item_id.in_(ids)).delete(synchronize_session=False)
+    db.query(models.Item).filter(models.Item.id.in_(ids)).delete(synchronize_session=False)
+    dedupe.promote_heads(db, [i.cluster_id for i in items if i.is_cluster_head and i.cluster_id])
+    db.commit()
+    return len(ids)
+
+def run_once(max_batches: Optional[int] = None, batch_size: int = BATCH_SIZE, pause: float = BATCH_PAUSE_SECONDS,
+             **criteria) -> Dict:
+    """Archive everything currently eligible, one short transaction per batch."""
+    now = datetime.utcnow()
+    archived = batches = 0
+    last_id = 0
+    while max_batches is None or batches < max_batches:
+        db = SessionLocal()
+        try:
+            ids = [r[0] for r in eligible(db, now, **criteria).filter(models.Item.id > last_id)
+                   .order_by(models.Item.id.asc()).limit(batch_size).all()]
+            if not ids:
+                break
+            archived += archive_batch(db, ids)
+        finally:
+            db.close()
+        batches += 1
+        last_id = ids[-1]
+        time.sleep(pause)
+    return {"archived": archived, "batches": batches}
+
+def get_archived(db: Session, item_id: int) -> Optional[Dict]:
+    row = db.query(models.ArchivedItem).filter(models.ArchivedItem.id == item_id).first()
+    return unpack(row) if row else None
+
+async def run_periodically(interval: float = INTERVAL_SECONDS):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            stats = await asyncio.to_thread(run_once)
+            if stats["archived"]:
+                log.info("retention: %s", stats)
+        except Exception:
+            log.exception("retention run failed")
@@ -1,7 +1,7 @@
 
-from pydantic import BaseModel
+from pydantic import BaseModel, HttpUrl
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class ItemBase(BaseModel):
     title: str
@@ -20,6 +20,9 @@ class Item(ItemBase):
     id: int
     importance: float
     fetched_at: Optional[datetime] = None
+    comment_count: int = 0
+    cluster_id: Optional[int] = None
+    is_archived: bool = False
 
     class Config:
         orm_mode = True
@@ -40,6 +43,12 @@ class Comment(CommentBase):
         orm_mode = True
 
 
+class CommentSummary(BaseModel):
+    item_id: int
+    count: int
+    latest: List[Comment]
+
+
 class ListingBase(BaseModel):
     title: str
     description: str | None = None
@@ -187,3 +196,18 @@ class PositionCreate(PositionBase): pass
 class Position(PositionBase):
     id: int
     class Config: orm_mode = True
+
+class WebhookSubscriptionBase(BaseModel):
+    url: str
+    kind: str = "generic"
+    city: str | None = None
+    category: str | None = None
+    min_importance: float = 0.0
+    is_active: bool = True
+
+class WebhookSubscriptionCreate(WebhookSubscriptionBase):
+    url: HttpUrl  # http(s) only; main.create_webhook also rejects non-public hosts
+class WebhookSubscription(WebhookSubscriptionBase):
+    id: int
+    created_at: datetime | None = None
+    class Config: orm_mode = True
@@ -0,0 +1,157 @@
+# In-process fan-out hub for pushing newly created Items to SSE subscribers.
+# Single worker only: each uvicorn process has its own hub, so run one worker
+# (or put a shared broker in front) if every client must see every item.
+import asyncio
+import os
+from typing import Dict, Optional, Sequence, Set, Tuple
+
+QUEUE_SIZE = 64          # per-subscriber backlog before it is considered slow
+HEARTBEAT_SECONDS = 15.0  # keeps idle connections open through proxies
+REPLAY_LIMIT = 100       # missed items replayed on reconnect; beyond that the client is told to re-sync
+SEEN_CLUSTERS = 32       # recent near-duplicate clusters remembered per subscriber (duplicates arrive close together)
+# Each open stream holds a socket and a queue; cap them so one client cannot exhaust
+# the worker's file descriptors or memory (~6 KB of heap per idle subscriber, see scripts/sse_idle.py).
+MAX_SUBSCRIBERS = int(os.environ.get("SSE_MAX_SUBSCRIBERS", "10000"))
+MAX_PER_CLIENT = int(os.environ.get("SSE_MAX_PER_CLIENT", "20"))
+
+class HubFull(Exception):
+    """Raised by ItemHub.subscribe when a subscriber limit is reached."""
+
+class Subscriber:
+    __slots__ = ("city", "category", "min_importance", "client", "queue", "seen")
+
+    def __init__(self, city: Optional[str], category: Optional[str], min_importance: float, client: Optional[str] = None):
+        self.client = client
+        self.city = city
+        self.category = category
+        self.min_importance = min_importance
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.seen: Dict[int, None] = {}  # cluster ids already delivered, oldest first
+
+    def matches(self, item) -> bool:
+        if self.category and item.category != self.category:
+            return False
+        return (item.importance or 0.0) >= self.min_importance
+
+class ItemHub:
+    """Fan out new items to subscribers. Publishing is safe from any thread;
+    delivery happens on the event loop that owns the subscribers."""
+
+    def __init__(self, max_subscribers: int = MAX_SUBSCRIBERS, max_per_client: int = MAX_PER_CLIENT):
+        self.max_subscribers = max_subscribers
+        self.max_per_client = max_per_client
+        # subscribers bucketed by city filter (None = all cities)
+        self._by_city: Dict[Optional[str], Set[Subscriber]] = {}
+        self._per_client: Dict[str, int] = {}
+        self._count = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.dropped = 0
+
+    def __len__(self):
+        return self._count
+
+    def subscribe(self, city: Optional[str] = None, category: Optional[str] = None, min_importance: float = 0.0,
+                  client: Optional[str] = None) -> Subscriber:
+        """Register a subscriber. Raises HubFull past max_subscribers, or past
+        max_per_client open streams for the same `client` (IP)."""
+        if self._count >= self.max_subscribers:
+            raise HubFull("too many subscribers")
+        if client is not None and self._per_client.get(client, 0) >= self.max_per_client:
+            raise HubFull("too many streams from this client")
+        self._loop = asyncio.get_running_loop()
+        sub = Subscriber(city, category, min_importance, client)
+        self._by_city.setdefault(city, set()).add(sub)
+        self._count += 1
+        if client is not None:
+            self._per_client[client] = self._per_client.get(client, 0) + 1
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        bucket = self._by_city.get(sub.city)
+        if bucket is None or sub not in bucket:
+            return  # already removed (dropped, then the stream closed)
+        bucket.discard(sub)
+        if not bucket:
+            del self._by_city[sub.city]
+        self._count -= 1
+        if sub.client is not None:
+            left = self._per_client[sub.client] - 1
+            if left:
+                self._per_client[sub.client] = left
+            else:
+                del self._per_client[sub.client]
+
+    def publish(self, item):
+        """Queue `item` (a schemas.Item) for delivery. Never blocks the caller."""
+        loop = self._loop
+        if not self._by_city or loop is None or loop.is_closed():
+            return
+        data = item.model_dump_json()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fanout(item, data)
+        else:
+            loop.call_soon_threadsafe(self._fanout, item, data)
+
+    def _fanout(self, item, data: str):
+        targets = list(self._by_city.get(None, ()))
+        if item.city is not None:
+            targets.extend(self._by_city.get(item.city, ()))
+        cluster = item.cluster_id or item.id
+        for sub in targets:
+            if cluster in sub.seen or not sub.matches(item):
+                continue  # a new head of a cluster this subscriber already has is not news to it
+            try:
+                sub.queue.put_nowait((item.id, data))
+            except asyncio.QueueFull:
+                self._drop(sub)
+                continue
+            sub.seen[cluster] = None
+            if len(sub.seen) > SEEN_CLUSTERS:
+                del sub.seen[next(iter(sub.seen))]
+
+    def _drop(self, sub: Subscriber):
+        # Slow consumer: discard its backlog and tell the stream to close.
+        # EventSource reconnects with Last-Event-ID and the endpoint replays what it missed.
+        self.unsubscribe(sub)
+        self.dropped += 1
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(None)
+
+hub = ItemHub()
+
+async def sse_events(sub: Subscriber, heartbeat: float = HEARTBEAT_SECONDS, cursor: Optional[int] = None,
+                     backlog: Sequence[Tuple[int, str]] = (), resync: bool = False):
+    """Yield SSE frames for `sub` until it is dropped or the client goes away.
+
+    `backlog` is replayed first and `resync` tells the client it missed too much to replay.
+    Then `cursor` (the newest item id when the stream opened) is sent as a bare event id, so
+    a client dropped before its next event still reconnects with a current Last-Event-ID."""
+    try:
+        yield "retry: 5000\n\n"
+        if resync:
+            yield "event: resync\ndata: {}\n\n"
+        replayed = set()
+        for item_id, data in backlog:
+            replayed.add(item_id)
+            yield f"id: {item_id}\nevent: item\ndata: {data}\n\n"
+        if cursor is not None:
+            yield f"id: {cursor}\n\n"
+        while True:
+            try:
+                msg = await asyncio.wait_for(sub.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if msg is None:
+                break
+            item_id, data = msg
+            if item_id in replayed:
+                continue  # published while the backlog was being read
+            yield f"id: {item_id}\nevent: item\ndata: {data}\n\n"
+    finally:
+        hub.unsubscribe(sub)
@@ -0,0 +1,218 @@
+# Webhook alerts for high-importance items (Slack / Discord / generic JSON).
+#
+# Ingest only writes WebhookOutbox rows, in the same transaction as the Item,
+# so a crash can never lose an alert and delivery never blocks ingest. A
+# background dispatcher drains the outbox once per window, coalescing every due
+# item for a subscription into digest POSTs, and retries failures with
+# exponential backoff. Rows are leased ('sending') before delivery, so an
+# on-demand POST /webhooks/dispatch never resends what the loop is sending.
+# Destinations must be public http(s) addresses, checked at registration and
+# again before every delivery, so subscriptions cannot probe internal services.
+import asyncio
+import ipaddress
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from . import models
+from .db import SessionLocal
+
+log = logging.getLogger(__name__)
+
+WINDOW_SECONDS = float(os.environ.get("WEBHOOK_WINDOW_SECONDS", "60"))
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 30.0
+BACKOFF_MAX_SECONDS = 3600.0
+MAX_DIGEST_ITEMS = 25       # larger backlogs go out as several digests in the same pass
+MAX_ROWS_PER_PASS = 1000    # bounds the work per pass; the rest is picked up next window
+LEASE_SECONDS = 300.0       # a 'sending' row older than this is assumed lost and retried
+MAX_CONCURRENCY = 10
+TIMEOUT_SECONDS = 10.0
+# Local testing only (e.g. scripts/webhook_stub.py on localhost): skip the public-address check.
+ALLOW_PRIVATE_HOSTS = os.environ.get("WEBHOOK_ALLOW_PRIVATE_HOSTS", "0") == "1"
+
+def destination_error(url: str) -> Optional[str]:
+    """Why `url` may not receive webhooks, or None. Every address its host resolves to must
+    be public: no loopback, link-local (cloud metadata), private or reserved ranges."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return "url must be an absolute http(s) URL"
+    if ALLOW_PRIVATE_HOSTS:
+        return None
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = socket.getaddrinfo(parts.hostname, port, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, ValueError):
+        return "url host does not resolve"
+    for *_, sockaddr in infos:
+        ip = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global:
+            return "url must point to a public address"
+    return None
+
+def enqueue_for_item(db: Session, item: models.Item):
+    """Add outbox rows for every subscription matching `item`, except those already alerted
+    about an earlier member of its near-duplicate cluster. The caller commits."""
+    earlier = db.query(models.Item.id).filter(models.Item.cluster_id == (item.cluster_id or item.id),
+                                              models.Item.id != item.id)
+    alerted = db.query(models.WebhookOutbox.subscription_id).filter(
+        models.WebhookOutbox.item_id.in_(earlier.scalar_subquery()), models.WebhookOutbox.status != "dead")
+    subs = db.query(models.WebhookSubscription.id).filter(
+        models.WebhookSubscription.id.not_in(alerted.scalar_subquery()),
+        models.WebhookSubscription.is_active == True,
+        models.WebhookSubscription.min_importance <= (item.importance or 0.0),
+        or_(models.WebhookSubscription.city.is_(None), models.WebhookSubscription.city == item.city),
+        or_(models.WebhookSubscription.category.is_(None), models.WebhookSubscription.category == item.category),
+    ).all()
+    for (sub_id,) in subs:
+        db.add(models.WebhookOutbox(subscription_id=sub_id, item_id=item.id))
+
+def backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1)))
+
+def build_payload(kind: str, items: List[models.Item]) -> Dict:
+    lines = [f"• {i.title} ({i.category or 'news'}, score {i.importance:.1f})" + (f" {i.url}" if i.url else "") for i in items]
+    header = f"CivicPulse: {len(items)} new high-importance item{'s' if len(items) != 1 else ''}"
+    if kind == "slack":
+        return {"text": header + "\n" + "\n".join(lines)}
+    if kind == "discord":
+        return {"content": (header + "\n" + "\n".join(lines))[:2000]}
+    return {"items": [{
+        "id": i.id, "title": i.title, "summary": i.summary, "url": i.url, "source": i.source,
+        "category": i.category, "city": i.city, "importance": i.importance,
+        "published_at": i.published_at.isoformat() if i.published_at else None,
+    } for i in items]}
+
+def _claim_due(db: Session, now: datetime, token: str) -> List[models.WebhookOutbox]:
+    """Atomically lease up to MAX_ROWS_PER_PASS due rows for this pass. Rows whose
+    lease expired (a pass that crashed mid-send) become due again."""
+    due = db.query(models.WebhookOutbox.id).filter(
+        or_(
+            and_(models.WebhookOutbox.status == "pending",
+                 or_(models.WebhookOutbox.next_attempt_at.is_(None), models.WebhookOutbox.next_attempt_at <= now)),
+            and_(models.WebhookOutbox.status == "sending", models.WebhookOutbox.next_attempt_at <= now),
+        )
+    ).order_by(models.WebhookOutbox.id.asc()).limit(MAX_ROWS_PER_PASS)
+    # single UPDATE ... WHERE id IN (SELECT ...): two concurrent passes cannot both claim a row
+    db.query(models.WebhookOutbox).filter(models.WebhookOutbox.id.in_(due.scalar_subquery())).update(
+        {models.WebhookOutbox.status: "sending", models.WebhookOutbox.claim: token,
+         models.WebhookOutbox.next_attempt_at: now + timedelta(seconds=LEASE_SECONDS)},
+        synchronize_session=False,
+    )
+    db.commit()
+    return db.query(models.WebhookOutbox).filter(models.WebhookOutbox.claim == token,
+                                                 models.WebhookOutbox.status == "sending") \
+        .order_by(models.WebhookOutbox.id.asc()).all()
+
+def _collect_due(now: datetime, token: str) -> List[Dict]:
+    """Claim due outbox rows and group them into digests of up to MAX_DIGEST_ITEMS per subscription."""
+    db = SessionLocal()
+    try:
+        rows = _claim_due(db, now, token)
+        if not rows:
+            return []
+        by_sub: Dict[int, List[models.WebhookOutbox]] = {}
+        for r in rows:
+            by_sub.setdefault(r.subscription_id, []).append(r)
+        subs = {s.id: s for s in db.query(models.WebhookSubscription).filter(models.WebhookSubscription.id.in_(by_sub)).all()}
+        items = {i.id: i for i in db.query(models.Item).filter(models.Item.id.in_({r.item_id for r in rows})).all()}
+        batches = []
+        for sub_id, group in by_sub.items():
+            sub = subs.get(sub_id)
+            live = [r for r in group if r.item_id in items]
+            for r in group:
+                if sub is None or not sub.is_active or r.item_id not in items:
+                    # subscription removed or item gone: nothing left to deliver
+                    r.status = "dead"
+                    r.claim = None
+                    r.last_error = "subscription inactive or item missing"
+            if sub is None or not sub.is_active:
+                continue
+            for i in range(0, len(live), MAX_DIGEST_ITEMS):
+                chunk = live[i:i + MAX_DIGEST_ITEMS]
+                batches.append({
+                    "url": sub.url,
+                    "payload": build_payload(sub.kind, [items[r.item_id] for r in chunk]),
+                    "outbox_ids": [r.id for r in chunk],
+                })
+        db.commit()
+        return batches
+    finally:
+        db.close()
+
+def _record_results(results: List[tuple], now: datetime, token: str):
+    db = SessionLocal()
+    try:
+        for batch, error in results:
+            rows = db.query(models.WebhookOutbox).filter(models.WebhookOutbox.id.in_(batch["outbox_ids"]),
+                                                         models.WebhookOutbox.claim == token).all()
+            for r in rows:
+                r.claim = None
+                if error is None:
+                    r.status = "sent"
+                    r.last_error = None
+                    continue
+                r.attempts = (r.attempts or 0) + 1
+                r.last_error = error[:500]
+                if r.attempts >= MAX_ATTEMPTS:
+                    r.status = "dead"
+                else:
+                    r.status = "pending"
+                    r.next_attempt_at = now + backoff(r.attempts)
+        db.commit()
+    finally:
+        db.close()
+
+async def _deliver(client: httpx.AsyncClient, sem: asyncio.Semaphore, batch: Dict):
+    async with sem:
+        # re-checked per delivery: the host's DNS may have changed since registration
+        blocked = await asyncio.to_thread(destination_error, batch["url"])
+        if blocked:
+            return batch, f"blocked: {blocked}"
+        try:
+            resp = await client.post(batch["url"], json=batch["payload"])
+        except httpx.HTTPError as e:
+            return batch, f"{type(e).__name__}: {e}"
+        if resp.status_code >= 300:
+            return batch, f"HTTP {resp.status_code}: {resp.text[:200]}"
+        return batch, None
+
+async def dispatch_once(client: httpx.AsyncClient) -> Dict:
+    """Deliver every due digest once. Returns counts for logging / the admin endpoint."""
+    token = uuid.uuid4().hex
+    batches = await asyncio.to_thread(_collect_due, datetime.utcnow(), token)
+    if not batches:
+        return {"digests": 0, "failed": 0}
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    results = await asyncio.gather(*(_deliver(client, sem, b) for b in batches))
+    await asyncio.to_thread(_record_results, results, datetime.utcnow(), token)
+    failed = sum(1 for _, err in results if err is not None)
+    return {"digests": len(batches), "failed": failed}
+
+def make_client() -> httpx.AsyncClient:
+    # one pooled client for the dispatcher's lifetime; connections are reused per host
+    return httpx.AsyncClient(
+        timeout=TIMEOUT_SECONDS,
+        limits=httpx.Limits(max_connections=MAX_CONCURRENCY, max_keepalive_connections=MAX_CONCURRENCY),
+    )
+
+async def run_dispatcher(window: float = WINDOW_SECONDS):
+    async with make_client() as client:
+        while True:
+            await asyncio.sleep(window)
+            try:
+                stats = await dispatch_once(client)
+                if stats["digests"]:
+                    log.info("webhook dispatch: %s", stats)
+            except Exception:
+                log.exception("webhook dispatch failed")
@@ -0,0 +1,66 @@
+"""Memory cost of idle SSE subscribers in the in-process hub.
+
+    python scripts/sse_idle.py --subscribers 10000
+
+Subscribes N idle clients (one sse_events generator each, parked on its
+queue like a real idle stream), publishes one item through the filters,
+and reports the Python heap (tracemalloc) and process RSS per subscriber.
+Sockets and uvicorn's per-connection state come on top (a few KB each in the
+kernel); size `ulimit -n` and SSE_MAX_SUBSCRIBERS from this.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import schemas  # noqa: E402
+from app.stream import ItemHub, sse_events  # noqa: E402
+import app.stream as stream  # noqa: E402
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--subscribers", type=int, default=10_000)
+    args = ap.parse_args()
+    n = args.subscribers
+
+    hub = ItemHub(max_subscribers=n, max_per_client=n)
+    stream.hub = hub  # sse_events unsubscribes from the module-level hub
+    rss0 = rss_mb()
+    tracemalloc.start()
+    subs, readers = [], []
+    for i in range(n):
+        sub = hub.subscribe(city="Knoxville, TN" if i % 2 else None, min_importance=float(i % 10), client="10.0.0.1")
+        gen = sse_events(sub, heartbeat=3600)
+        await gen.__anext__()  # the initial retry: frame
+        subs.append(sub)
+        readers.append(asyncio.ensure_future(gen.__anext__()))
+    await asyncio.sleep(0)
+    heap, _ = tracemalloc.get_traced_memory()
+    rss1 = rss_mb()
+
+    item = schemas.Item(id=1, title="Budget hearing", city="Knoxville, TN", importance=4.5)
+    t = time.perf_counter()
+    hub.publish(item)
+    fanout_ms = (time.perf_counter() - t) * 1000
+    expected = sum(1 for s in subs if s.matches(item))
+    while sum(1 for r in readers if r.done()) < expected:
+        await asyncio.sleep(0.01)
+    deliver_ms = (time.perf_counter() - t) * 1000
+
+    print(f"subscribers={len(hub)}  heap={heap / 1e6:.1f} MB ({heap / n / 1024:.1f} KB each)  "
+          f"rss +{rss1 - rss0:.1f} MB ({(rss1 - rss0) * 1024 / n:.1f} KB each)")
+    print(f"one publish: queued for {expected} matching subscribers in {fanout_ms:.1f} ms, "
+          f"all frames yielded after {deliver_ms:.1f} ms")
+    for r in readers:
+        r.cancel()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,44 @@
+"""Local stub receiver for exercising webhook delivery.
+
+    python scripts/webhook_stub.py --port 9000 --fail-first 2
+
+Start the API with WEBHOOK_ALLOW_PRIVATE_HOSTS=1 (localhost is otherwise refused),
+register it with `POST /webhooks {"url": "http://localhost:9000/hook"}`, ingest,
+then `POST /webhooks/dispatch`. With --fail-first N the first N requests get a
+503 so retry/backoff can be observed in the `webhook_outbox` table.
+"""
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=9000)
+    ap.add_argument("--fail-first", type=int, default=0)
+    args = ap.parse_args()
+    state = {"remaining_failures": args.fail_first, "received": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so pooled connections are reused
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if state["remaining_failures"] > 0:
+                state["remaining_failures"] -= 1
+                code = 503
+            else:
+                state["received"] += 1
+                code = 200
+            print(code, self.path, json.dumps(json.loads(body or b"{}"), indent=2), flush=True)
+            self.send_response(code)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *a):
+            pass
+
+    print(f"webhook stub listening on :{args.port}", flush=True)
+    ThreadingHTTPServer(("", args.port), Handler).serve_forever()
+
+if __name__ == "__main__":
+    main()
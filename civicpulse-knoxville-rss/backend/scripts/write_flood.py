@@ -0,0 +1,133 @@
+"""Load test: read latency on GET /items with and without a write flood.
+
+    uvicorn app.main:app --port 8000            # in another terminal
+    python scripts/write_flood.py --base http://localhost:8000
+
+Readers send GET /items at a fixed --read-rps, below what the server can
+serve, so there is headroom to show what the flood costs. (Back-to-back
+readers saturate the server by themselves, and then any extra traffic,
+even no-op requests, raises their latency.)
+Phase 1 runs readers alone; phase 2 runs the same readers while flooders
+send POST /comments from one client at --flood-rps. With flood control on, nearly all
+flood requests get 429 before touching SQLite, so read p99 should stay flat.
+Phase 3 is a control: the same request rate against GET /health, i.e. the
+cost of the HTTP traffic alone. If phase 2 matches phase 3, the rejected
+writes cost no more than a no-op request.
+
+Flooders run in a separate process from the readers. Run the load generator
+on a different core/host than the API, or its own CPU use shows up as read
+latency. On a single shared core, rank the processes the way separate hosts
+would behave: API first, readers next, flood only on spare CPU, and check
+that the reported flood rate still matches --flood-rps:
+
+    chrt -f 50 uvicorn app.main:app --port 8000
+    chrt -f 40 python scripts/write_flood.py --isolate
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import Counter
+
+import httpx
+
+def pct(samples, p):
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(len(s) * p))] * 1000 if s else float("nan")
+
+async def reader(client, stop, out, errors, interval):
+    # open loop at `interval` (0 = back to back); latency is measured from the scheduled
+    # send time, so a stalled server shows up in p99 instead of slowing the readers down
+    nxt = time.monotonic()
+    while time.monotonic() < stop:
+        t = time.perf_counter() - max(0.0, time.monotonic() - nxt) if interval else time.perf_counter()
+        try:
+            r = await client.get("/items", params={"limit": 50})
+            r.raise_for_status()
+        except httpx.HTTPError:
+            errors["read"] += 1
+        else:
+            out.append(time.perf_counter() - t)
+        if interval:
+            nxt += interval
+            await asyncio.sleep(max(0.0, nxt - time.monotonic()))
+
+async def flooder(client, stop, item_id, statuses, interval, path):
+    # open loop: a fixed send rate, like a real spammer, rather than closed-loop max throughput
+    nxt = time.monotonic()
+    while time.monotonic() < stop:
+        try:
+            if path == "/health":
+                r = await client.get(path)
+            else:
+                r = await client.post(path, json={"item_id": item_id, "body": "spam"})
+            statuses[r.status_code] += 1
+        except httpx.HTTPError:
+            statuses["error"] += 1
+        nxt += interval
+        await asyncio.sleep(max(0.0, nxt - time.monotonic()))
+
+async def flood(base, flooders, duration, item_id, flood_rps, path):
+    statuses = Counter()
+    async with httpx.AsyncClient(base_url=base, limits=httpx.Limits(max_connections=flooders), timeout=30) as client:
+        stop = time.monotonic() + duration
+        await asyncio.gather(*(flooder(client, stop, item_id, statuses, flooders / flood_rps, path) for _ in range(flooders)))
+    return statuses
+
+def flood_process(results, idle, *args):
+    # Own process (and event loop), so flood bookkeeping never delays a reader's response
+    # handling; with --isolate it only gets CPU the API and the readers leave idle.
+    if idle:
+        os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+    results.put(dict(asyncio.run(flood(*args))))
+
+async def phase(base, readers, flooders, duration, item_id, flood_rps, path="/comments", read_rps=0.0, isolate=False):
+    lat, errors = [], Counter()
+    proc = None
+    if flooders:
+        results = multiprocessing.Queue()
+        proc = multiprocessing.Process(target=flood_process, args=(results, isolate, base, flooders, duration, item_id,
+                                                                   flood_rps, path))
+        proc.start()
+    async with httpx.AsyncClient(base_url=base, limits=httpx.Limits(max_connections=readers), timeout=30) as client:
+        stop = time.monotonic() + duration
+        await asyncio.gather(*(reader(client, stop, lat, errors, readers / read_rps if read_rps else 0.0)
+                               for _ in range(readers)))
+    statuses = Counter()
+    if proc is not None:
+        statuses.update(await asyncio.to_thread(results.get))
+        proc.join()
+    return lat, errors["read"], statuses
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base", default="http://localhost:8000")
+    ap.add_argument("--readers", type=int, default=8)
+    ap.add_argument("--flooders", type=int, default=32)
+    ap.add_argument("--read-rps", type=float, default=100.0,
+                    help="total read rate; 0 = readers back to back (saturates the server, so p99 cannot stay flat)")
+    ap.add_argument("--flood-rps", type=float, default=200.0)
+    ap.add_argument("--duration", type=float, default=10.0)
+    ap.add_argument("--isolate", action="store_true",
+                    help="run the flood process as SCHED_IDLE (Linux), for a single shared core")
+    args = ap.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.base) as client:
+        items = (await client.get("/items", params={"limit": 1})).json()
+        if not items:
+            await client.post("/ingest/from-config")
+            items = (await client.get("/items", params={"limit": 1})).json()
+    item_id = items[0]["id"]
+
+    phases = (("reads only", 0, "/comments"), ("reads + write flood", args.flooders, "/comments"),
+              ("reads + /health control", args.flooders, "/health"))
+    for name, flooders, path in phases:
+        lat, errors, statuses = await phase(args.base, args.readers, flooders, args.duration, item_id, args.flood_rps,
+                                            path, args.read_rps, args.isolate)
+        sent = sum(statuses.values())
+        print(f"{name:24s} reads={len(lat):6d} errors={errors}  p50={pct(lat, 0.50):7.1f}ms  p99={pct(lat, 0.99):7.1f}ms"
+              + (f"  flood={sent / args.duration:.0f} rps {dict(statuses)}" if flooders else ""))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,38 @@
+import os
+import tempfile
+
+import pytest
+
+# Point the app at a throwaway database and keep background loops off before app.main is imported.
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+os.environ.setdefault("WEBHOOK_DISPATCHER", "0")
+os.environ.setdefault("RETENTION_WORKER", "0")
+os.environ.setdefault("WEBHOOK_ALLOW_PRIVATE_HOSTS", "1")  # fake hosts like stub.local; test_webhooks turns the check back on
+
+from fastapi.testclient import TestClient
+
+from app.db import Base, engine
+from app.main import app
+from app.ratelimit import RateLimitMiddleware
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(autouse=True)
+def fresh_db(monkeypatch):
+    monkeypatch.chdir(BACKEND_DIR)  # ingest reads app/scraper_sources.yaml relative to cwd
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    reset_rate_limits()
+    yield
+
+def reset_rate_limits():
+    layer = app.middleware_stack
+    while layer is not None:
+        if isinstance(layer, RateLimitMiddleware):
+            layer.backend = type(layer.backend)()
+        layer = getattr(layer, "app", None)
+
+@pytest.fixture
+def client():
+    return TestClient(app)
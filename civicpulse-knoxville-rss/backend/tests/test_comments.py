@@ -0,0 +1,29 @@
+def _item(client, title="Budget hearing"):
+    return client.post("/items", json={"title": title, "category": "agenda", "city": "Knoxville, TN"}).json()
+
+def test_count_is_maintained_and_listed(client):
+    itm = _item(client)
+    for i in range(3):
+        assert client.post("/comments", json={"item_id": itm["id"], "body": f"c{i}"}).status_code == 200
+    assert client.post("/comments", json={"item_id": 9999, "body": "x"}).status_code == 404
+    assert client.get("/items").json()[0]["comment_count"] == 3
+
+def test_summary_returns_counts_and_latest(client):
+    a, b = _item(client, "Zoning change A"), _item(client, "Road closure B")
+    for i in range(4):
+        client.post("/comments", json={"item_id": a["id"], "body": f"a{i}"})
+    r = client.get("/comments/summary", params=[("item_ids", a["id"]), ("item_ids", b["id"]), ("latest", 2)]).json()
+    assert [(x["item_id"], x["count"], [c["body"] for c in x["latest"]]) for x in r] == [
+        (a["id"], 4, ["a3", "a2"]), (b["id"], 0, [])]
+
+def test_pagination_and_limit_bounds(client):
+    itm = _item(client)
+    for i in range(5):
+        client.post("/comments", json={"item_id": itm["id"], "body": f"c{i}"})
+    first = client.get(f"/comments/{itm['id']}", params={"limit": 3}).json()
+    assert [c["body"] for c in first] == ["c4", "c3", "c2"]
+    rest = client.get(f"/comments/{itm['id']}", params={"limit": 3, "before_id": first[-1]["id"]}).json()
+    assert [c["body"] for c in rest] == ["c1", "c0"]
+    assert client.get(f"/comments/{itm['id']}", params={"before_id": 0}).json() == []
+    for bad in (-1, 0, 201):
+        assert client.get(f"/comments/{itm['id']}", params={"limit": bad}).status_code == 422
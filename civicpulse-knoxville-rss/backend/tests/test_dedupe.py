@@ -0,0 +1,64 @@
+import yaml
+
+from app import main, models
+from app.db import SessionLocal
+
+KNOX = "Knoxville, TN"
+
+def _post(client, title, category="agenda", source="city.gov", summary=None):
+    return client.post("/items", json={"title": title, "summary": summary, "category": category,
+                                       "source": source, "city": KNOX}).json()
+
+def test_shipped_sources_are_not_collapsed(client):
+    with open("app/scraper_sources.yaml") as f:
+        sources = yaml.safe_load(f)
+    assert client.post("/ingest/from-config").json() == {"created": len(sources)}
+    feed = client.get("/items").json()
+    assert len(feed) == len(sources)
+    assert len({i["cluster_id"] for i in feed}) == len(sources)
+
+def test_reworded_duplicate_collapses_to_most_important(client):
+    a = _post(client, "City Council Regular Meeting Agenda - October 21, 2026", source="local_news")
+    b = _post(client, "Knoxville City Council regular meeting agenda for Oct. 21, 2026", source="city.gov")
+    assert b["cluster_id"] == a["id"]
+    assert b["importance"] > a["importance"]
+    assert [i["id"] for i in client.get("/items").json()] == [b["id"]]
+    assert {i["id"] for i in client.get("/items", params={"cluster_id": a["id"]}).json()} == {a["id"], b["id"]}
+    assert len(client.get("/items", params={"collapse": False}).json()) == 2
+
+def test_different_dates_or_categories_stay_apart(client):
+    a = _post(client, "City Council Regular Meeting Agenda - October 21, 2026")
+    b = _post(client, "City Council Regular Meeting Agenda - November 4, 2026")
+    c = _post(client, "City Council Regular Meeting Agenda - October 21, 2026", category="news")
+    assert len({a["cluster_id"], b["cluster_id"], c["cluster_id"]}) == 3
+
+def test_shared_boilerplate_summary_is_ignored(client):
+    blurb = "This is a placeholder item. Replace with parsed summary."
+    a = _post(client, "Sample from Knoxville City Council - Agendas", summary=blurb)
+    b = _post(client, "Sample from Knox County Commission - Agendas", summary=blurb)
+    assert a["cluster_id"] != b["cluster_id"]
+
+def test_duplicates_are_not_alerted_twice(client):
+    client.post("/webhooks", json={"url": "http://stub.local/hook"})
+    _post(client, "City Council Regular Meeting Agenda - October 21, 2026")
+    _post(client, "Knoxville City Council regular meeting agenda for Oct. 21, 2026")
+    with SessionLocal() as db:
+        assert db.query(models.WebhookOutbox).count() == 1
+
+def test_official_version_alerts_when_it_takes_over(client, monkeypatch):
+    everything = client.post("/webhooks", json={"url": "http://stub.local/all"}).json()
+    important = client.post("/webhooks", json={"url": "http://stub.local/important", "min_importance": 3.0}).json()
+    pushed = []
+    monkeypatch.setattr(main.hub, "publish", lambda item: pushed.append(item.id))
+    post = _post(client, "City Council Regular Meeting Agenda - October 21, 2026", source="community")
+    official = client.post("/items", json={"title": "Knoxville City Council regular meeting agenda for Oct. 21, 2026",
+                                           "category": "agenda", "source": "city.gov", "city": KNOX,
+                                           "is_official": True}).json()
+    assert post["importance"] < 3.0 <= official["importance"]
+    assert official["cluster_id"] == post["id"]
+    assert [i["id"] for i in client.get("/items").json()] == [official["id"]]
+    # the new head is pushed and alerted, but not to the subscription that already has this story
+    assert pushed == [post["id"], official["id"]]
+    with SessionLocal() as db:
+        rows = {(r.subscription_id, r.item_id) for r in db.query(models.WebhookOutbox)}
+    assert rows == {(everything["id"], post["id"]), (important["id"], official["id"])}
@@ -0,0 +1,65 @@
+import asyncio
+
+from app import models
+from app.db import SessionLocal
+from app.ratelimit import MemoryBackend, RateLimitMiddleware
+
+def _call(mw, client="10.0.0.9", xff=None, path="/comments"):
+    sent = []
+    async def inner(scope, receive, send):
+        sent.append(200)
+    async def send(msg):
+        if msg["type"] == "http.response.start":
+            sent.append(msg["status"])
+    mw.app = inner
+    headers = [(b"x-forwarded-for", xff.encode())] if xff else []
+    scope = {"type": "http", "method": "POST", "path": path, "headers": headers, "client": (client, 1234)}
+    asyncio.run(mw(scope, None, send))
+    return sent[0]
+
+def test_burst_then_429():
+    mw = RateLimitMiddleware(None, backend=MemoryBackend(), limits={("POST", "/comments"): (2, 1.0)})
+    assert [_call(mw) for _ in range(3)] == [200, 200, 429]
+    assert _call(mw, path="/listings") == 200  # unlisted paths are not limited
+
+def test_spoofed_forwarded_for_does_not_bypass():
+    mw = RateLimitMiddleware(None, backend=MemoryBackend(), limits={("POST", "/comments"): (1, 1.0)}, proxy_hops=1)
+    assert _call(mw, xff="1.1.1.1, 203.0.113.7") == 200
+    # attacker rotates the leftmost value; the proxy-added (rightmost) entry stays the same
+    assert _call(mw, xff="2.2.2.2, 203.0.113.7") == 429
+    assert _call(mw, xff="203.0.113.8") == 200
+
+def test_forwarded_for_ignored_without_trusted_proxy():
+    mw = RateLimitMiddleware(None, backend=MemoryBackend(), limits={("POST", "/comments"): (1, 1.0)}, proxy_hops=0)
+    assert _call(mw, xff="1.1.1.1") == 200
+    assert _call(mw, xff="2.2.2.2") == 429
+
+def test_buckets_are_lru_bounded():
+    backend = MemoryBackend(max_buckets=100)
+    mw = RateLimitMiddleware(None, backend=backend, limits={("POST", "/comments"): (1, 1.0)})
+    for i in range(500):
+        _call(mw, client=f"10.0.{i // 256}.{i % 256}")
+    assert len(backend._buckets) == 100
+
+def test_rejected_before_db_work(client):
+    itm = client.post("/items", json={"title": "Budget hearing"}).json()
+    codes = [client.post("/comments", json={"item_id": itm["id"], "body": "spam"}).status_code for _ in range(8)]
+    assert codes.count(200) == 5 and codes[5:] == [429, 429, 429]
+    with SessionLocal() as db:
+        assert db.query(models.Comment).count() == 5
+
+def test_redis_backend_is_awaited_and_fails_open():
+    from app.ratelimit import RedisBackend
+    calls = []
+    class FakeRedis:
+        def register_script(self, script):
+            async def run(keys, args):
+                calls.append(keys[0])
+                if len(calls) > 1:
+                    raise ConnectionError("redis down")
+                return b"2.5"
+            return run
+    backend = RedisBackend(FakeRedis())
+    assert asyncio.run(backend.take("ip|/comments", 5, 0.1, 0.0)) == 2.5
+    assert asyncio.run(backend.take("ip|/comments", 5, 0.1, 0.0)) == 0.0
+    assert calls == ["rl:ip|/comments"] * 2
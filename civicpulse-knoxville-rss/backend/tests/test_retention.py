@@ -0,0 +1,70 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+
+from app import models, retention
+from app.db import Base, add_missing_columns, enable_autoincrement, engine
+
+OLD = "2020-01-01T00:00:00"
+
+def _item(client, title, published_at=OLD):
+    return client.post("/items", json={"title": title, "category": "agenda", "city": "Knoxville, TN",
+                                       "published_at": published_at}).json()
+
+def test_archived_ids_are_not_reused(client):
+    keep = _item(client, "Budget hearing", published_at=None)
+    old = _item(client, "Old zoning notice")
+    client.post("/comments", json={"item_id": old["id"], "body": "from 2020"})
+    assert retention.run_once(pause=0)["archived"] == 1
+    new = _item(client, "Road closure on Broadway", published_at=None)
+    assert new["id"] > old["id"] > keep["id"]
+    archived = client.get(f"/items/{old['id']}").json()
+    assert (archived["title"], archived["is_archived"]) == ("Old zoning notice", True)
+    assert [c["body"] for c in client.get(f"/comments/{old['id']}").json()] == ["from 2020"]
+    # a second archived item gets its own row instead of colliding with the first
+    client.post("/items", json={"title": "Another old notice", "published_at": OLD})
+    assert retention.run_once(pause=0)["archived"] == 1
+
+def test_concurrent_comment_cannot_land_mid_archive(client, monkeypatch):
+    old = _item(client, "Old zoning notice")
+    client.post("/comments", json={"item_id": old["id"], "body": "first"})
+    other = create_engine(str(engine.url), connect_args={"timeout": 0.1})
+    blocked = []
+    real_pack = retention.pack
+
+    def pack_with_writer(item, comments):
+        # what POST /comments does, from another connection, while the batch is open
+        try:
+            with other.begin() as conn:
+                conn.exec_driver_sql("UPDATE items SET comment_count = comment_count + 1 WHERE id = ?", (item.id,))
+                conn.exec_driver_sql("INSERT INTO comments (item_id, body) VALUES (?, 'late')", (item.id,))
+        except Exception as e:
+            blocked.append(isinstance(e.orig, sqlite3.OperationalError))
+        return real_pack(item, comments)
+
+    monkeypatch.setattr(retention, "pack", pack_with_writer)
+    assert retention.run_once(pause=0)["archived"] == 1
+    other.dispose()
+    assert blocked == [True]
+    assert [c["body"] for c in client.get(f"/comments/{old['id']}").json()] == ["first"]
+    # once the batch commits, the writer finds the item gone and gets a 404 instead of losing the comment
+    assert client.post("/comments", json={"item_id": old["id"], "body": "late"}).status_code == 404
+
+def test_legacy_items_table_gets_autoincrement():
+    legacy = create_engine("sqlite://")  # in-memory: one shared connection
+    with legacy.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE items (id INTEGER PRIMARY KEY, title VARCHAR NOT NULL)")
+        conn.exec_driver_sql("INSERT INTO items (id, title) VALUES (1, 'a'), (2, 'b'), (5, 'c')")
+    Base.metadata.create_all(bind=legacy)
+    add_missing_columns(legacy)
+    assert enable_autoincrement(legacy) == ["items"]
+    assert enable_autoincrement(legacy) == []
+    with legacy.begin() as conn:
+        assert [r[0] for r in conn.exec_driver_sql("SELECT id FROM items ORDER BY id")] == [1, 2, 5]
+        conn.exec_driver_sql("DELETE FROM items WHERE id = 5")
+        conn.exec_driver_sql("INSERT INTO items (title) VALUES ('d')")
+        assert conn.exec_driver_sql("SELECT MAX(id) FROM items").scalar() == 6
+        indexes = {r[0] for r in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE tbl_name = 'items' AND type = 'index'")}
+    assert {idx.name for idx in models.Item.__table__.indexes} <= indexes
+    legacy.dispose()
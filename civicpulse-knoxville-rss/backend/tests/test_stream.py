@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app import main, schemas, stream
+from app.stream import HubFull, ItemHub, sse_events
+
+KNOX = "Knoxville, TN"
+
+def _item(item_id, city=KNOX, category="agenda", importance=5.0):
+    return schemas.Item(id=item_id, title=f"Item {item_id}", city=city, category=category, importance=importance)
+
+def _drain(sub):
+    out = []
+    while not sub.queue.empty():
+        msg = sub.queue.get_nowait()
+        out.append(msg if msg is None else msg[0])
+    return out
+
+@pytest.fixture
+def hub(monkeypatch):
+    h = ItemHub(max_subscribers=5, max_per_client=2)
+    monkeypatch.setattr(stream, "hub", h)  # sse_events unsubscribes from the module-level hub
+    return h
+
+def test_filters_by_city_category_and_importance(hub):
+    async def run():
+        everything = hub.subscribe()
+        knox = hub.subscribe(city=KNOX)
+        agendas = hub.subscribe(category="agenda", min_importance=4.0)
+        hub.publish(_item(1))
+        hub.publish(_item(2, city="Maryville, TN"))
+        hub.publish(_item(3, category="event"))
+        hub.publish(_item(4, importance=3.0))
+        return _drain(everything), _drain(knox), _drain(agendas)
+    assert asyncio.run(run()) == ([1, 2, 3, 4], [1, 3, 4], [1, 2])
+
+def test_new_cluster_head_skips_subscribers_that_have_the_story(hub):
+    async def run():
+        everything = hub.subscribe()
+        important = hub.subscribe(min_importance=4.0)
+        hub.publish(_item(1, importance=1.4))
+        hub.publish(_item(2, importance=4.1).model_copy(update={"cluster_id": 1}))  # official version takes over
+        return _drain(everything), _drain(important)
+    assert asyncio.run(run()) == ([1], [2])
+
+def test_slow_consumer_is_dropped_with_close_sentinel(hub):
+    async def run():
+        slow = hub.subscribe()
+        for i in range(stream.QUEUE_SIZE + 1):
+            hub.publish(_item(i + 1))
+        return _drain(slow)
+    assert asyncio.run(run()) == [None]
+    assert hub.dropped == 1 and len(hub) == 0
+
+def test_stream_ends_on_sentinel_and_unsubscribes(hub):
+    async def run():
+        sub = hub.subscribe()
+        frames = sse_events(sub, cursor=7)
+        assert await frames.__anext__() == "retry: 5000\n\n"
+        assert await frames.__anext__() == "id: 7\n\n"
+        hub.publish(_item(8))
+        assert (await frames.__anext__()).startswith("id: 8\nevent: item\ndata: {")
+        hub._drop(sub)
+        return [f async for f in frames]
+    assert asyncio.run(run()) == []
+    assert len(hub) == 0
+
+def test_client_disconnect_unsubscribes(hub):
+    async def run():
+        frames = sse_events(hub.subscribe(client="10.0.0.1"))
+        await frames.__anext__()
+        assert len(hub) == 1
+        await frames.aclose()
+    asyncio.run(run())
+    assert len(hub) == 0 and hub._per_client == {}
+
+def test_publish_from_worker_thread(hub):
+    # create_item is a sync endpoint and runs in the threadpool, off the event loop
+    def publish_later():
+        time.sleep(0.05)  # while the loop is parked waiting on the queue
+        hub.publish(_item(1))
+
+    async def run():
+        sub = hub.subscribe()
+        started = time.monotonic()
+        threading.Thread(target=publish_later).start()
+        # an unsafe cross-thread put would only be noticed when the loop next wakes (the 5 s timeout)
+        item_id = (await asyncio.wait_for(sub.queue.get(), timeout=5))[0]
+        return item_id, time.monotonic() - started
+    item_id, elapsed = asyncio.run(run())
+    assert item_id == 1 and elapsed < 1
+
+def test_subscriber_limits(hub):
+    async def run():
+        a, b = hub.subscribe(client="10.0.0.1"), hub.subscribe(client="10.0.0.1")
+        with pytest.raises(HubFull):
+            hub.subscribe(client="10.0.0.1")
+        hub.unsubscribe(a)
+        hub.unsubscribe(a)  # dropped, then the stream closed: counted once
+        hub.subscribe(client="10.0.0.1")
+        for i in range(3):
+            hub.subscribe(client=f"10.0.0.{i + 2}")
+        with pytest.raises(HubFull):
+            hub.subscribe(client="10.0.0.9")
+        return len(hub)
+    assert asyncio.run(run()) == 5
+
+def test_stream_endpoint_returns_503_when_full(client, monkeypatch):
+    monkeypatch.setattr(main, "hub", ItemHub(max_subscribers=0))
+    r = client.get("/items/stream")
+    assert r.status_code == 503 and r.headers["retry-after"] == "30"
+
+def test_reconnect_replays_missed_items(client, monkeypatch):
+    ids = [client.post("/items", json={"title": t, "city": KNOX, "category": "agenda"}).json()["id"]
+           for t in ("Budget hearing", "Road closure on Broadway", "Library board meeting")]
+    client.post("/items", json={"title": "Farmers market opens", "city": "Maryville, TN"})
+    cursor, backlog, resync = main._stream_backlog(ids[0], KNOX, None, 0.0)
+    assert [i for i, _ in backlog] == ids[1:] and not resync
+    assert cursor == ids[-1] + 1
+    assert main._stream_backlog(None, KNOX, None, 0.0) == (cursor, [], False)
+    monkeypatch.setattr(main, "REPLAY_LIMIT", 1)
+    assert main._stream_backlog(ids[0], KNOX, None, 0.0) == (cursor, [], True)
+
+def test_replayed_items_are_not_sent_twice(hub):
+    async def run():
+        sub = hub.subscribe()
+        hub.publish(_item(2))  # published while the backlog was being read
+        hub.publish(_item(3))
+        frames = sse_events(sub, cursor=2, backlog=[(2, "{}")])
+        out = [await frames.__anext__() for _ in range(4)]
+        await frames.aclose()
+        return out
+    assert [f.split("\n")[0] for f in asyncio.run(run())] == ["retry: 5000", "id: 2", "id: 2", "id: 3"]
@@ -0,0 +1,113 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import httpx
+
+from app import models, webhooks
+from app.db import SessionLocal
+
+def _dispatch(handler):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as c:
+            return await webhooks.dispatch_once(c)
+    return asyncio.run(run())
+
+def _outbox():
+    with SessionLocal() as db:
+        return db.query(models.WebhookOutbox).order_by(models.WebhookOutbox.id).all()
+
+def _make_due():
+    with SessionLocal() as db:
+        db.query(models.WebhookOutbox).filter(models.WebhookOutbox.status == "pending") \
+            .update({models.WebhookOutbox.next_attempt_at: datetime.utcnow() - timedelta(seconds=1)})
+        db.commit()
+
+def _subscribe(client, **kw):
+    return client.post("/webhooks", json={"url": "http://stub.local/hook", **kw}).json()
+
+def _add_items(client, n, **kw):
+    for i in range(n):
+        client.post("/items", json={"title": f"Ordinance {i} public hearing", "category": "legislation",
+                                    "source": "city.gov", "city": "Knoxville, TN", **kw})
+
+def test_items_coalesce_into_one_digest(client):
+    _subscribe(client)
+    _add_items(client, 3)
+    bodies = []
+    stats = _dispatch(lambda req: bodies.append(json.loads(req.content)) or httpx.Response(200))
+    assert stats == {"digests": 1, "failed": 0}
+    assert len(bodies[0]["items"]) == 3
+    assert {r.status for r in _outbox()} == {"sent"}
+    assert _dispatch(lambda req: httpx.Response(200)) == {"digests": 0, "failed": 0}
+
+def test_backlog_larger_than_digest_is_sent_in_one_pass(client, monkeypatch):
+    monkeypatch.setattr(webhooks, "MAX_DIGEST_ITEMS", 2)
+    _subscribe(client)
+    _add_items(client, 5)
+    stats = _dispatch(lambda req: httpx.Response(200))
+    assert stats == {"digests": 3, "failed": 0}
+    assert {r.status for r in _outbox()} == {"sent"}
+
+def test_filters_and_threshold(client):
+    _subscribe(client, min_importance=100.0)
+    _subscribe(client, category="event")
+    _add_items(client, 2)
+    assert _outbox() == []
+
+def test_503_backs_off_then_goes_dead(client, monkeypatch):
+    monkeypatch.setattr(webhooks, "MAX_ATTEMPTS", 3)
+    _subscribe(client)
+    _add_items(client, 1)
+    fail = lambda req: httpx.Response(503)
+
+    assert _dispatch(fail) == {"digests": 1, "failed": 1}
+    row = _outbox()[0]
+    assert (row.status, row.attempts) == ("pending", 1)
+    assert row.next_attempt_at > datetime.utcnow() + timedelta(seconds=webhooks.BACKOFF_BASE_SECONDS - 5)
+    # not due yet: nothing is sent
+    assert _dispatch(fail) == {"digests": 0, "failed": 0}
+
+    _make_due()
+    _dispatch(fail)
+    row = _outbox()[0]
+    assert (row.status, row.attempts) == ("pending", 2)
+    assert row.next_attempt_at > datetime.utcnow() + timedelta(seconds=2 * webhooks.BACKOFF_BASE_SECONDS - 5)
+
+    _make_due()
+    _dispatch(fail)
+    row = _outbox()[0]
+    assert (row.status, row.attempts) == ("dead", 3)
+    assert "503" in row.last_error
+
+def test_claimed_rows_are_not_sent_twice(client):
+    _subscribe(client)
+    _add_items(client, 2)
+    # another pass holds the lease
+    with SessionLocal() as db:
+        claimed = webhooks._claim_due(db, datetime.utcnow(), "other-pass")
+    assert len(claimed) == 2
+    assert _dispatch(lambda req: httpx.Response(200)) == {"digests": 0, "failed": 0}
+
+def test_internal_destinations_are_rejected(monkeypatch):
+    monkeypatch.setattr(webhooks, "ALLOW_PRIVATE_HOSTS", False)
+    for url in ("http://127.0.0.1:8000/hook", "http://localhost/hook", "http://169.254.169.254/latest/meta-data",
+                "http://10.0.0.5/hook", "http://192.168.1.1/", "http://[::1]/hook", "http://[::ffff:127.0.0.1]/",
+                "http://0.0.0.0/", "ftp://93.184.216.34/hook"):
+        assert webhooks.destination_error(url), url
+    assert webhooks.destination_error("https://93.184.216.34/hook") is None
+
+def test_registration_validates_url(client, monkeypatch):
+    monkeypatch.setattr(webhooks, "ALLOW_PRIVATE_HOSTS", False)
+    assert client.post("/webhooks", json={"url": "not a url"}).status_code == 422
+    assert client.post("/webhooks", json={"url": "http://169.254.169.254/latest"}).status_code == 400
+    assert client.post("/webhooks", json={"url": "https://93.184.216.34/hook"}).status_code == 200
+    assert client.post("/webhooks", json={"url": "https://93.184.216.34/hook"}).status_code == 429
+
+def test_delivery_rechecks_destination(client, monkeypatch):
+    _subscribe(client)
+    _add_items(client, 1)
+    monkeypatch.setattr(webhooks, "ALLOW_PRIVATE_HOSTS", False)  # stub.local does not resolve to a public address
+    sent = []
+    assert _dispatch(lambda req: sent.append(req) or httpx.Response(200)) == {"digests": 1, "failed": 1}
+    assert sent == [] and _outbox()[0].last_error.startswith("blocked:")
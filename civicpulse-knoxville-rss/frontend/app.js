@@ -10,18 +10,34 @@ async function load() {
   const data = await res.json();
   const feed = document.getElementById('feed');
   feed.innerHTML = '';
-  data.forEach(i => {
-    const li = document.createElement('li');
-    li.className = 'card';
-    li.innerHTML = `
-      <h3><a href="${i.url || '#'}" target="_blank" rel="noopener">${i.title}</a></h3>
-      <div class="meta">
-        ${i.category || 'news'} • ${i.source || 'community'} • score ${i.importance.toFixed(2)}${i.city ? ' • ' + i.city : ''}
-      </div>
-      <p class="summary">${i.summary || ''}</p>
-    `;
-    feed.appendChild(li);
+  data.forEach(i => feed.appendChild(itemCard(i)));
+  watch(city, category);
+}
+function itemCard(i) {
+  const li = document.createElement('li');
+  li.className = 'card';
+  li.innerHTML = `
+    <h3><a href="${i.url || '#'}" target="_blank" rel="noopener">${i.title}</a></h3>
+    <div class="meta">
+      ${i.category || 'news'} • ${i.source || 'community'} • score ${i.importance.toFixed(2)}${i.city ? ' • ' + i.city : ''}${i.comment_count ? ' • ' + i.comment_count + ' comments' : ''}
+    </div>
+    <p class="summary">${i.summary || ''}</p>
+  `;
+  return li;
+}
+// Push new items from the server instead of re-polling /items
+let stream = null;
+function watch(city, category) {
+  if (stream) stream.close();
+  const params = new URLSearchParams();
+  if (city) params.set('city', city);
+  if (category) params.set('category', category);
+  stream = new EventSource(`${API}/items/stream?${params.toString()}`);
+  stream.addEventListener('item', e => {
+    document.getElementById('feed').prepend(itemCard(JSON.parse(e.data)));
   });
+  // On reconnect the server replays missed items after Last-Event-ID; if it missed too many, reload instead
+  stream.addEventListener('resync', () => load());
 }
 document.getElementById('load').addEventListener('click', load);
 window.addEventListener('load', async () => {